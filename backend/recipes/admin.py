@@ -1,13 +1,107 @@
 from colorfield.fields import ColorField
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.forms.models import BaseInlineFormSet
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.search import recipe_ingredient_index
+from users.paginations import EstimatedCountPaginator
+
+
+class InputFilter(admin.SimpleListFilter):
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        return ((None, None),)
+
+    def choices(self, changelist):
+        yield {
+            'query_parts': [
+                (key, value)
+                for key, value in changelist.get_filters_params().items()
+                if key != self.parameter_name
+            ],
+        }
+
+
+class AuthorFilter(InputFilter):
+    title = 'автору (username или email)'
+    parameter_name = 'author'
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value:
+            return queryset.filter(
+                Q(author__username=value) | Q(author__email=value)
+            )
+
+        return queryset
+
+
+class TagFilter(admin.SimpleListFilter):
+    title = 'тегу'
+    parameter_name = 'tag'
+
+    def lookups(self, request, model_admin):
+        return Tag.objects.values_list('slug', 'name')
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__slug=self.value()
+            )))
+
+        return queryset
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    per_page = 50
+    page_param = 'page'
+    page_number = 1
+
+    def get_queryset(self):
+        if not hasattr(self, 'page'):
+            paginator = Paginator(super().get_queryset(), self.per_page)
+            self.page = paginator.get_page(self.page_number)
+            self.page_range = paginator.get_elided_page_range(
+                self.page.number
+            )
+
+        return self.page.object_list
+
+
+class RecipeIngredientInline(admin.TabularInline):
+    model = RecipeIngredient
+    formset = PaginatedInlineFormSet
+    template = 'admin/recipes/paginated_tabular.html'
+    autocomplete_fields = ('ingredient',)
+    extra = 0
+    per_page = 25
+    page_param = 'ingredients_page'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.per_page = self.per_page
+        formset.page_param = self.page_param
+        formset.page_number = request.GET.get(self.page_param, 1)
+        return formset
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'count_of_additions',)
+    list_display = ('name', 'author', 'count_of_additions', 'created_at',)
+    list_select_related = ('author',)
     readonly_fields = ('count_of_additions',)
-    list_filter = ('author', 'name', 'tags',)
+    list_filter = (AuthorFilter, TagFilter,)
+    search_fields = ('name',)
+    autocomplete_fields = ('author', 'tags',)
+    inlines = (RecipeIngredientInline,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fields = (
         'author',
         'name',
@@ -19,19 +113,30 @@ class RecipeAdmin(admin.ModelAdmin):
     )
 
     @admin.display(
-        description='Число добавлений в избранное'
+        description='Число добавлений в избранное',
+        ordering='favorites_count'
     )
     def count_of_additions(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        recipe_id = form.instance.id
+        transaction.on_commit(
+            lambda: recipe_ingredient_index.refresh(recipe_id)
+        )
 
 
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit',)
-    list_filter = ('name',)
+    search_fields = ('name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name',)
+    search_fields = ('name', 'slug',)
     formfield_overrides = {
         ColorField: {'widget': admin.widgets.AdminTextInputWidget},
     }
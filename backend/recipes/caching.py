@@ -0,0 +1,135 @@
+import hashlib
+import time
+from array import array
+from threading import Lock
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import quote_etag
+
+VERSION_KEY = 'version:{}'
+ID_SET_KEY = 'ids:{}:{}:{}'
+INGREDIENTS_VERSION = 'ingredients'
+TAGS_VERSION = 'tags'
+RECIPE_INGREDIENTS_VERSION = 'recipe_ingredients'
+RECIPES_VERSION = 'recipes'
+RECIPE_VERSION = 'recipe:{}'
+USER_VERSION = 'user:{}'
+ID_SET_VERSION = 'ids:{}:{}'
+
+
+def get_version(name):
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+
+    return version
+
+
+def get_versions(names):
+    keys = {VERSION_KEY.format(name): name for name in names}
+    versions = cache.get_many(keys)
+    missing = keys.keys() - versions.keys()
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), timeout=None)
+
+        versions.update(cache.get_many(missing))
+
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_version(name):
+    key = VERSION_KEY.format(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+class Versioned:
+    def __init__(self, version_name, build):
+        self.version_name = version_name
+        self.build = build
+        self._lock = Lock()
+        self._state = (None, None)
+
+    def get(self):
+        version = get_version(self.version_name)
+        state = self._state
+        if state[0] != version:
+            value = self.build()
+            with self._lock:
+                self._state = state = (version, value)
+
+        return state[1]
+
+
+class Snapshot(Versioned):
+    def __init__(self, version_name, render):
+        super().__init__(version_name, lambda: self.with_etag(render()))
+
+    @staticmethod
+    def with_etag(content):
+        return content, quote_etag(hashlib.md5(content).hexdigest())
+
+
+class UserIdSet:
+    # Массив id в кэше под версией пользователя: запись в базу сменяет
+    # версию после коммита, и старый массив больше не читается.
+    def __init__(self, name, model_label, user_field, value_field):
+        self.name = name
+        self.model_label = model_label
+        self.user_field = user_field
+        self.value_field = value_field
+        self.context_key = f'{name}_ids'
+
+    def get_version_name(self, user_id):
+        return ID_SET_VERSION.format(self.name, user_id)
+
+    def get(self, user):
+        if not user.is_authenticated:
+            return frozenset()
+
+        key = ID_SET_KEY.format(
+            self.name, user.id, get_version(self.get_version_name(user.id))
+        )
+        ids = array('q')
+        data = cache.get(key)
+        if data is None:
+            ids.extend(apps.get_model(self.model_label).objects.filter(
+                **{self.user_field: user}
+            ).values_list(self.value_field, flat=True))
+            cache.set(
+                key, ids.tobytes(), timeout=settings.USER_ID_SET_TIMEOUT
+            )
+        else:
+            ids.frombytes(data)
+
+        return frozenset(ids)
+
+    def from_context(self, context):
+        if self.context_key not in context:
+            request = context.get('request')
+            context[self.context_key] = (
+                self.get(request.user) if request else frozenset()
+            )
+
+        return context[self.context_key]
+
+    def invalidate(self, user_id):
+        version_name = self.get_version_name(user_id)
+        transaction.on_commit(lambda: bump_version(version_name))
+
+
+favorite_ids = UserIdSet('favorited', 'recipes.Favorite', 'user', 'recipe_id')
+purchase_ids = UserIdSet('in_cart', 'recipes.Purchase', 'user', 'recipe_id')
+subscription_ids = UserIdSet(
+    'subscribed', 'users.Subscription', 'subscriber', 'subscribed_to_id'
+)
@@ -0,0 +1,55 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes.Recipe', 'favorites_count', 'recipes.Favorite', 'recipe'),
+    ('users.User', 'recipes_count', 'recipes.Recipe', 'author'),
+    ('users.User', 'subscribers_count', 'users.Subscription', 'subscribed_to'),
+)
+
+
+class CounterFieldsMixin:
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        # Счётчики меняются только через F(): полное сохранение загруженного
+        # объекта не должно перезаписывать их устаревшими значениями.
+        if (not args and not self._state.adding
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+
+        super().save(*args, **kwargs)
+
+
+def change(model, pk, field, delta):
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+
+    queryset.update(**{field: F(field) + delta})
+
+
+def reconcile(apps):
+    fixed = {}
+    for model_name, field, related_model_name, lookup in COUNTERS:
+        model = apps.get_model(model_name)
+        related_model = apps.get_model(related_model_name)
+        actual = Coalesce(Subquery(
+            related_model.objects.filter(
+                **{lookup: OuterRef('pk')}
+            ).order_by().values(lookup).annotate(
+                count=Count('pk')
+            ).values('count')
+        ), 0)
+        fixed[f'{model._meta.label}.{field}'] = model.objects.annotate(
+            actual_count=actual
+        ).exclude(**{field: F('actual_count')}).update(**{field: actual})
+
+    return fixed
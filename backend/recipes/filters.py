@@ -1,7 +1,36 @@
 import django_filters
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import BooleanFilter
+from rest_framework.filters import OrderingFilter
 
-from recipes.models import Recipe, Tag
+from recipes import fulltext
+from recipes.caching import TAGS_VERSION, Versioned
+from recipes.models import Favorite, Purchase, Recipe, Tag
+
+tag_ids_by_slug = Versioned(
+    TAGS_VERSION, lambda: dict(Tag.objects.values_list('slug', 'id'))
+)
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in tag_ids_by_slug.get()]
+
+
+class TiebreakOrderingFilter(OrderingFilter):
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view) or ()
+        fields = {field.lstrip('-') for field in ordering}
+        return (*ordering, *(
+            field for field in view.ordering_tiebreak
+            if field.lstrip('-') not in fields
+        ))
+
+    def filter_queryset(self, request, queryset, view):
+        # Без параметра сохраняется порядок queryset, например релевантность.
+        if self.ordering_param not in request.query_params:
+            return queryset
+
+        return super().filter_queryset(request, queryset, view)
 
 
 class RecipeFilter(django_filters.FilterSet):
@@ -9,24 +38,44 @@ class RecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
-    tags = django_filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = django_filters.MultipleChoiceFilter(
+        method='filter_tags',
+        choices=get_tag_choices,
     )
+    author = django_filters.NumberFilter(field_name='author_id')
+    search = django_filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'tags', 'author',)
+        fields = (
+            'is_favorited', 'is_in_shopping_cart', 'tags', 'author', 'search',
+        )
 
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(Exists(Favorite.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
 
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(purchases__user=self.request.user)
+            return queryset.filter(Exists(Purchase.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
 
         return queryset
+
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+
+        tag_ids = tag_ids_by_slug.get()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=[tag_ids[slug] for slug in value]
+        )))
+
+    def filter_search(self, queryset, name, value):
+        return fulltext.search(queryset, value)
@@ -0,0 +1,71 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes import rendering
+from recipes.caching import (INGREDIENTS_VERSION, RECIPE_VERSION, TAGS_VERSION,
+                             USER_VERSION, favorite_ids, get_versions,
+                             purchase_ids, subscription_ids)
+
+FRAGMENT_KEY = 'fragment:recipe:{}:{}'
+USER_ID_SETS = (favorite_ids, purchase_ids, subscription_ids)
+
+
+def get_fragment_keys(recipes, request):
+    names = {TAGS_VERSION, INGREDIENTS_VERSION}
+    for recipe in recipes:
+        names.add(RECIPE_VERSION.format(recipe.id))
+        names.add(USER_VERSION.format(recipe.author_id))
+
+    versions = get_versions(names)
+    host = request.build_absolute_uri('/')
+    return {
+        recipe.id: FRAGMENT_KEY.format(recipe.id, hashlib.md5(repr((
+            host,
+            versions[RECIPE_VERSION.format(recipe.id)],
+            versions[USER_VERSION.format(recipe.author_id)],
+            versions[TAGS_VERSION],
+            versions[INGREDIENTS_VERSION],
+        )).encode()).hexdigest())
+        for recipe in recipes
+    }
+
+
+def get_fragments(recipes, request):
+    # Общая для всех пользователей часть представления рецепта.
+    keys = get_fragment_keys(recipes, request)
+    cached = cache.get_many(keys.values())
+    fragments = {
+        recipe_id: cached[key]
+        for recipe_id, key in keys.items() if key in cached
+    }
+    missing = keys.keys() - fragments.keys()
+    if missing:
+        rendered = rendering.render_recipes(missing, request)
+        cache.set_many({
+            keys[recipe_id]: fragment
+            for recipe_id, fragment in rendered.items()
+        }, timeout=settings.RECIPE_FRAGMENT_TIMEOUT)
+        fragments.update(rendered)
+
+    return fragments
+
+
+def render_recipes(recipes, request):
+    fragments = get_fragments(recipes, request)
+    favorited, in_cart, subscribed = (
+        id_set.get(request.user) for id_set in USER_ID_SETS
+    )
+    return [
+        {
+            **fragments[recipe.id],
+            'author': {
+                **fragments[recipe.id]['author'],
+                'is_subscribed': recipe.author_id in subscribed,
+            },
+            'is_favorited': recipe.id in favorited,
+            'is_in_shopping_cart': recipe.id in in_cart,
+        }
+        for recipe in recipes if recipe.id in fragments
+    ]
@@ -0,0 +1,157 @@
+import re
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVectorField)
+from django.db import connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+RANK_TIEBREAK = ('-created_at', '-id')
+
+POSTGRESQL_INSTALL = (
+    'ALTER TABLE recipes_recipe '
+    'ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    '''
+    CREATE OR REPLACE FUNCTION recipes_recipe_search_vector_update()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('pg_catalog.russian',
+                                  coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('pg_catalog.russian',
+                                     coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger '
+    'ON recipes_recipe',
+    'CREATE TRIGGER recipes_recipe_search_vector_trigger '
+    'BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe '
+    'FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_vector_update()',
+    'UPDATE recipes_recipe SET name = name',
+    'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+    'ON recipes_recipe USING gin (search_vector)',
+)
+POSTGRESQL_UNINSTALL = (
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger '
+    'ON recipes_recipe',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update()',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+# unicode61 не сводит «ё» к «е», поэтому текст нормализуется при индексации.
+SQLITE_VALUES = (
+    "{row}.id, "
+    "replace(replace({row}.name, 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace({row}.text, 'ё', 'е'), 'Ё', 'Е')"
+)
+SQLITE_INSTALL = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+    "name, text, tokenize='unicode61')",
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES ({SQLITE_VALUES.format(row='new')});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES ({SQLITE_VALUES.format(row='new')});
+    END
+    ''',
+    f'DELETE FROM {FTS_TABLE}',
+    f'INSERT INTO {FTS_TABLE}(rowid, name, text) '
+    f'SELECT {SQLITE_VALUES.format(row="recipes_recipe")} '
+    'FROM recipes_recipe',
+)
+SQLITE_UNINSTALL = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+STATEMENTS = {
+    'postgresql': (POSTGRESQL_INSTALL, POSTGRESQL_UNINSTALL),
+    'sqlite': (SQLITE_INSTALL, SQLITE_UNINSTALL),
+}
+
+
+def execute(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def install(connection):
+    install_statements, _ = STATEMENTS.get(connection.vendor, ((), ()))
+    execute(connection, install_statements)
+
+
+def uninstall(connection):
+    _, uninstall_statements = STATEMENTS.get(connection.vendor, ((), ()))
+    execute(connection, uninstall_statements)
+
+
+def is_installed(connection):
+    if connection.vendor != 'sqlite':
+        return True
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' "
+            'AND name LIKE %s',
+            (f'{FTS_TABLE}_%',)
+        )
+        return cursor.fetchone()[0] == 3
+
+
+def search(queryset, value):
+    if connections[queryset.db].vendor == 'sqlite':
+        return search_sqlite(queryset, value)
+
+    return search_postgresql(queryset, value)
+
+
+def search_postgresql(queryset, value):
+    vector = RawSQL(
+        '"recipes_recipe"."search_vector"', [],
+        output_field=SearchVectorField()
+    )
+    query = SearchQuery(value, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.alias(
+        search_vector=vector,
+        search_rank=SearchRank(vector, query)
+    ).filter(search_vector=query).order_by('-search_rank', *RANK_TIEBREAK)
+
+
+def search_sqlite(queryset, value):
+    words = re.findall(r'\w+', value.replace('ё', 'е').replace('Ё', 'Е'))
+    if not words:
+        return queryset.none()
+
+    match = ' '.join(f'"{word}"*' for word in words)
+    return queryset.alias(
+        search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND {FTS_TABLE}.rowid = "recipes_recipe"."id"',
+            (match,),
+            output_field=FloatField()
+        )
+    ).filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match,)
+    )).order_by('-search_rank', *RANK_TIEBREAK)
@@ -0,0 +1,73 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+VARIANTS_DIR = 'recipes/images/variants/'
+VARIANT_WIDTHS = {
+    'thumb': 160,
+    'card': 480,
+    'full': 1200,
+}
+VARIANT_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+QUALITY = 80
+
+
+def get_variant_name(image_name, variant, extension):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{VARIANTS_DIR}{stem}_{variant}.{extension}'
+
+
+def open_image(field_file, max_width=None):
+    field_file.open('rb')
+    try:
+        with Image.open(field_file) as image:
+            if max_width:
+                # JPEG сразу декодируется в уменьшенном масштабе.
+                image.draft('RGB', (max_width, max_width))
+
+            ImageOps.exif_transpose(image, in_place=True)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                return background
+
+            if image.mode == 'RGB':
+                return image
+
+            return image.convert('RGB')
+    finally:
+        field_file.close()
+
+
+def generate_variants(recipe):
+    storage = recipe.image.storage
+    widths = sorted(VARIANT_WIDTHS.items(), key=lambda item: item[1])
+    image = open_image(recipe.image, max_width=widths[-1][1])
+    last = next(
+        (index for index, (_, width) in enumerate(widths)
+         if width >= image.width),
+        len(widths) - 1
+    )
+    variants = {extension: [] for extension in VARIANT_FORMATS}
+    # От большего к меньшему: каждый вариант уменьшается из предыдущего,
+    # копии исходника в полном разрешении не создаются.
+    for variant, width in reversed(widths[:last + 1]):
+        image.thumbnail((width, image.height), Image.LANCZOS)
+        for extension, image_format in VARIANT_FORMATS.items():
+            buffer = io.BytesIO()
+            image.save(buffer, image_format, quality=QUALITY)
+            name = storage.save(
+                get_variant_name(recipe.image.name, variant, extension),
+                ContentFile(buffer.getvalue())
+            )
+            variants[extension].insert(0, (name, image.width))
+
+    recipe.image_variants = variants
+    recipe.save(update_fields=('image_variants',))
+    return variants
@@ -0,0 +1,111 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from recipes import rendering
+from recipes.fragments import USER_ID_SETS
+from recipes.models import Ingredient, Recipe
+from recipes.search import ingredient_index
+from recipes.serializers import RecipeSerializer
+from users.authentication import CachedTokenAuthentication
+
+
+def measure(function, arguments, number):
+    timings = []
+    for _ in range(number):
+        for argument in arguments:
+            started = time.perf_counter()
+            function(argument)
+            timings.append(time.perf_counter() - started)
+
+    timings.sort()
+    return {
+        'mean': statistics.mean(timings),
+        'p95': timings[int(len(timings) * 0.95)],
+    }
+
+
+def benchmark_ingredient_search(number):
+    names = Ingredient.objects.values_list('name', flat=True)[:50]
+    queries = [name[:length] for name in names for length in (1, 2, 4)]
+    ingredient_index.load()
+    yield 'index', measure(ingredient_index.search, queries, number)
+    yield 'database', measure(
+        lambda query: list(Ingredient.objects.filter(
+            name__istartswith=query
+        ).values('id', 'name', 'measurement_unit')),
+        queries,
+        max(number // 10, 1)
+    )
+
+
+def benchmark_token_authentication(number):
+    keys = list(Token.objects.filter(
+        user__is_active=True
+    ).values_list('key', flat=True)[:50])
+    if not keys:
+        raise CommandError('Нет токенов для замера')
+
+    cached = CachedTokenAuthentication()
+    for key in keys:
+        cached.authenticate_credentials(key)
+
+    yield 'cached', measure(cached.authenticate_credentials, keys, number)
+    yield 'database', measure(
+        TokenAuthentication().authenticate_credentials, keys, number
+    )
+
+
+def benchmark_recipe_rendering(number):
+    recipe_ids = list(
+        Recipe.objects.values_list('id', flat=True)[:settings.MAX_PAGE_SIZE]
+    )
+    host = next(
+        (host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'),
+        'localhost'
+    )
+    request = RequestFactory().get('/', HTTP_HOST=host)
+    context = {
+        'request': request,
+        **{id_set.context_key: frozenset() for id_set in USER_ID_SETS}
+    }
+
+    def render_serializer(recipe_ids):
+        return RecipeSerializer(
+            Recipe.objects.with_related().filter(id__in=recipe_ids),
+            many=True,
+            context=context
+        ).data
+
+    def render_rows(recipe_ids):
+        return rendering.render_recipes(recipe_ids, request)
+
+    yield 'rows', measure(render_rows, [recipe_ids], number)
+    yield 'serializer', measure(render_serializer, [recipe_ids], number)
+
+
+CASES = {
+    'ingredient_search': benchmark_ingredient_search,
+    'recipe_rendering': benchmark_recipe_rendering,
+    'token_authentication': benchmark_token_authentication,
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure latency of hot code paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('case', choices=sorted(CASES))
+        parser.add_argument('--number', type=int, default=100)
+
+    def handle(self, *args, **options):
+        for name, result in CASES[options['case']](options['number']):
+            self.stdout.write(
+                f'{name}: mean {result["mean"] * 1e6:.1f} µs, '
+                f'p95 {result["p95"] * 1e6:.1f} µs'
+            )
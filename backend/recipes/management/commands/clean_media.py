@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes import storage
+from recipes.models import MediaFile
+
+
+class Command(BaseCommand):
+    help = "Find and delete media files no recipe refers to"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete', action='store_true',
+            help='Удалить найденные файлы, а не только вывести их'
+        )
+        parser.add_argument(
+            '--older-than', type=int, default=24,
+            help='Не трогать файлы, освобождённые менее N часов назад'
+        )
+
+    def handle(self, *args, **options):
+        fixed = storage.reconcile(apps)
+        stale = MediaFile.objects.filter(
+            references=0,
+            updated_at__lt=timezone.now() - timedelta(
+                hours=options['older_than']
+            )
+        )
+        found = deleted = 0
+        for media_file_id, name in list(stale.values_list('id', 'name')):
+            found += 1
+            self.stdout.write(name)
+            if not options['delete']:
+                continue
+
+            # Файл мог снова понадобиться: условие проверяется заново под
+            # блокировкой, которую ждёт storage.touch().
+            with transaction.atomic():
+                media_file = stale.select_for_update().filter(
+                    id=media_file_id
+                ).first()
+                if media_file is None:
+                    continue
+
+                default_storage.delete(name)
+                media_file.delete()
+                deleted += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Success! Исправлено счётчиков: {fixed}, '
+            f'неиспользуемых файлов: {found}, удалено: {deleted}'
+        ))
@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from recipes.models import Favorite, Purchase, Recipe, Tag
+
+User = get_user_model()
+
+INDEX_MARKERS = ('Index', 'USING INDEX', 'USING COVERING INDEX',
+                 'USING INTEGER PRIMARY KEY')
+
+
+def get_hot_queries():
+    user = User.objects.order_by('id').first()
+    recipe = Recipe.objects.order_by('id').first()
+    tag = Tag.objects.order_by('id').first()
+    if not (user and recipe and tag):
+        raise CommandError('Нужны пользователь, рецепт и тэг в базе')
+
+    return {
+        'recipe feed': Recipe.objects.all()[:6],
+        'recipes by author': Recipe.objects.filter(author=recipe.author)[:6],
+        'recipes by tag': Recipe.tags.through.objects.filter(tag=tag),
+        'favorites of user': Favorite.objects.filter(user=user),
+        'favorites of recipe': Favorite.objects.filter(recipe=recipe),
+        'cart of user': Purchase.objects.filter(user=user),
+        'cart of recipe': Purchase.objects.filter(recipe=recipe),
+    }
+
+
+class Command(BaseCommand):
+    help = "Show query plans of the hot queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Завершиться с ошибкой, если план не использует индекс'
+        )
+
+    def handle(self, *args, **options):
+        without_index = []
+        for name, queryset in get_hot_queries().items():
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            if not any(marker in plan for marker in INDEX_MARKERS):
+                without_index.append(name)
+
+        if options['check'] and without_index:
+            raise CommandError(
+                f'Без индекса ({connection.vendor}): '
+                + ', '.join(without_index)
+            )
@@ -0,0 +1,34 @@
+from django.core.management import BaseCommand
+
+from recipes.images import generate_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Generate responsive image variants for recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать варианты для всех рецептов'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.only('id', 'image', 'image_variants')
+        if not options['force']:
+            recipes = recipes.filter(image_variants={})
+
+        generated = failed = 0
+        for recipe in recipes.iterator():
+            try:
+                generate_variants(recipe)
+                generated += 1
+            except (OSError, ValueError) as e:
+                failed += 1
+                self.stdout.write(
+                    self.style.ERROR(f'Recipe {recipe.id}: {e.args}')
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Success! Обработано: {generated}, ошибок: {failed}'
+        ))
@@ -1,39 +1,132 @@
 import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
 
+from recipes.caching import INGREDIENTS_VERSION, bump_version
 from recipes.models import Ingredient
 
+DATA_DIR = Path(settings.BASE_DIR).parent / 'data'
 FILENAME = "ingredients.csv"
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+SEPARATORS = ' \t\r\n,'
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Ожидается JSON-массив ингредиентов')
+
+    position = 1
+    while True:
+        while position < len(buffer) and buffer[position] in SEPARATORS:
+            position += 1
+
+        if buffer.startswith(']', position):
+            return
+
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise
+
+            # Буфер обрезается только при дочитывании, а не на каждом объекте.
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
 
 
 class Command(BaseCommand):
     help = "Load ingredients"
 
-    def check_duplicate(self, row):
-        return Ingredient.objects.filter(
-            name=row[0],
-            measurement_unit=row[1]
-        ).exists()
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=FILENAME,
+            help='Путь к файлу или имя файла в каталоге data'
+        )
+        parser.add_argument('--format', choices=sorted(READERS))
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def get_path(self, path):
+        path = Path(path)
+        if not path.exists() and not path.is_absolute():
+            return DATA_DIR / path
+
+        return path
 
     def handle(self, *args, **options):
+        started = time.monotonic()
+        path = self.get_path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат файла «{file_format}», '
+                f'поддерживаются: {", ".join(sorted(READERS))}'
+            )
+
+        reader = READERS[file_format]
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть не меньше 1')
+
+        seen = set()
+        duplicates = 0
         try:
-            with open(
-                    f'{settings.BASE_DIR}/../data/{FILENAME}', "r",
-                    newline="", encoding='utf-8-sig'
-            ) as file:
-                reader = csv.reader(file)
-                ingredients = [
-                    Ingredient(
-                        name=row[0],
-                        measurement_unit=row[1]
-                    ) for row in reader if not self.check_duplicate(row)
-                ]
-
-                Ingredient.objects.bulk_create(ingredients)
-
-            self.stdout.write(self.style.SUCCESS('Success!'))
+            count_before = Ingredient.objects.count()
+            with open(path, "r", newline="", encoding='utf-8-sig') as file:
+                rows = reader(file)
+                while True:
+                    batch = list(islice(rows, batch_size))
+                    if not batch:
+                        break
+
+                    ingredients = []
+                    for name, measurement_unit in batch:
+                        key = (name.strip(), measurement_unit.strip())
+                        if key in seen:
+                            duplicates += 1
+                            continue
+
+                        seen.add(key)
+                        ingredients.append(
+                            Ingredient(name=key[0], measurement_unit=key[1])
+                        )
+
+                    Ingredient.objects.bulk_create(
+                        ingredients, batch_size=batch_size,
+                        ignore_conflicts=True
+                    )
+
+            inserted = Ingredient.objects.count() - count_before
+            bump_version(INGREDIENTS_VERSION)
+            self.stdout.write(self.style.SUCCESS(
+                f'Success! Добавлено: {inserted}, '
+                f'уже в базе: {len(seen) - inserted}, '
+                f'дубликатов в файле: {duplicates}, '
+                f'время: {time.monotonic() - started:.2f} с'
+            ))
 
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error: {e.args}'))
+            raise CommandError(f'Error: {e.args}') from e
@@ -0,0 +1,16 @@
+from django.apps import apps
+from django.core.management import BaseCommand
+
+from recipes import counters
+
+
+class Command(BaseCommand):
+    help = "Recalculate denormalized counters"
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile(apps)
+        self.stdout.write(self.style.SUCCESS(
+            'Success! Исправлено: ' + ', '.join(
+                f'{counter}: {count}' for counter, count in fixed.items()
+            )
+        ))
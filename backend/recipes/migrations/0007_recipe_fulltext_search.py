@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from recipes import fulltext
+
+
+def install(apps, schema_editor):
+    fulltext.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    fulltext.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:59
+
+from django.db import migrations, models
+
+from recipes import counters
+
+
+def reconcile_counters(apps, schema_editor):
+    counters.reconcile(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_fulltext_search'),
+        ('users', '0006_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число добавлений в избранное'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-created_at', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.RunPython(reconcile_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.3 on 2026-10-18 06:12
+
+from django.db import migrations, models
+
+from recipes import storage
+
+
+def reconcile_media(apps, schema_editor):
+    storage.reconcile(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Путь в хранилище')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Время изменения')),
+            ],
+            options={
+                'verbose_name': 'Медиафайл',
+                'verbose_name_plural': 'Медиафайлы',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='mediafile',
+            index=models.Index(fields=['references', 'updated_at'], name='mediafile_stale_idx'),
+        ),
+        migrations.RunPython(reconcile_media, migrations.RunPython.noop),
+    ]
@@ -2,7 +2,11 @@ from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import F, Prefetch, UniqueConstraint, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+
+from recipes.counters import CounterFieldsMixin
 
 User = get_user_model()
 
@@ -60,7 +64,42 @@ class Ingredient(models.Model):
         ]
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('id')
+            )
+        )
+
+    def first_per_author(self, author_ids, limit):
+        if not author_ids:
+            return self.none()
+
+        ranked = self.model.objects.filter(
+            author_id__in=author_ids
+        ).annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=[F('created_at').desc(), F('id').desc()]
+            )
+        ).order_by().values('pk', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(pk__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            'WHERE ranked.row_number <= %s',
+            (*params, limit)
+        ))
+
+
+class Recipe(CounterFieldsMixin, models.Model):
+    counter_fields = ('favorites_count',)
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -74,6 +113,12 @@ class Recipe(models.Model):
     image = models.ImageField(
         upload_to='recipes/images/', verbose_name='Изображение'
     )
+    image_variants = models.JSONField(
+        verbose_name='Варианты изображения',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     text = models.TextField(verbose_name='Описание')
     ingredients = models.ManyToManyField(
         'Ingredient',
@@ -97,6 +142,13 @@ class Recipe(models.Model):
         verbose_name='Время добавления',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Число добавлений в избранное',
+        default=0,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -104,7 +156,20 @@ class Recipe(models.Model):
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-created_at', 'name',)
+        ordering = ('-created_at', '-id',)
+        indexes = [
+            models.Index(
+                fields=('-created_at', '-id'), name='recipe_created_at_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-created_at', '-id'),
+                name='recipe_author_created_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-created_at', '-id'),
+                name='recipe_favorites_count_idx'
+            ),
+        ]
 
 
 class RecipeIngredient(models.Model):
@@ -155,7 +220,12 @@ class Favorite(Preference):
                 fields=['user', 'recipe'], name='favorite_unique_user_recipe'
             )
         ]
-        ordering = ('user', 'recipe',)
+        indexes = [
+            models.Index(
+                fields=('recipe', 'user'), name='favorite_recipe_user_idx'
+            ),
+        ]
+        ordering = ('user_id', 'recipe_id',)
         default_related_name = 'favorites'
 
 
@@ -168,5 +238,35 @@ class Purchase(Preference):
                 fields=['user', 'recipe'], name='purchase_unique_user_recipe'
             )
         ]
-        ordering = ('user', 'recipe',)
+        indexes = [
+            models.Index(
+                fields=('recipe', 'user'), name='purchase_recipe_user_idx'
+            ),
+        ]
+        ordering = ('user_id', 'recipe_id',)
         default_related_name = 'purchases'
+
+
+class MediaFile(models.Model):
+    name = models.CharField(
+        max_length=255, unique=True, verbose_name='Путь в хранилище'
+    )
+    references = models.PositiveIntegerField(
+        default=0, verbose_name='Число ссылок'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True, verbose_name='Время изменения'
+    )
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+        indexes = [
+            models.Index(
+                fields=('references', 'updated_at'),
+                name='mediafile_stale_idx'
+            ),
+        ]
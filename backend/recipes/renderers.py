@@ -0,0 +1,59 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class ShoppingCartTextMixin:
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Список покупок отдаётся потоком, сюда попадают только ошибки.
+        if isinstance(data, dict):
+            data = [f'{key}: {value}' for key, value in data.items()]
+
+        return '\n'.join(map(str, data)).encode(self.charset)
+
+
+class CSVShoppingCartRenderer(ShoppingCartTextMixin, BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class TextShoppingCartRenderer(ShoppingCartTextMixin, BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        for name, amount, measurement_unit in rows:
+            yield f'{name} ({measurement_unit}) — {amount}\n'
+
+
+class JSONShoppingCartRenderer(JSONRenderer):
+    format = 'json'
+
+    def stream(self, rows):
+        separator = ''
+        yield '['
+        for name, amount, measurement_unit in rows:
+            yield separator + json.dumps(
+                {
+                    'name': name,
+                    'amount': amount,
+                    'measurement_unit': measurement_unit
+                },
+                ensure_ascii=False
+            )
+            separator = ','
+
+        yield ']'
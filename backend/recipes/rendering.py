@@ -0,0 +1,107 @@
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+
+from recipes.models import Recipe, RecipeIngredient
+
+# Повторяет RecipeSerializer без машинерии полей DRF; флаги пользователя
+# выставляются в False и накладываются позже.
+RECIPE_FIELDS = (
+    'id',
+    'name',
+    'image',
+    'image_variants',
+    'text',
+    'cooking_time',
+    'author__email',
+    'author__id',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+)
+
+
+def get_url(name, request):
+    return request.build_absolute_uri(default_storage.url(name))
+
+
+def render_srcset(variants, request):
+    return {
+        extension: ', '.join(
+            f'{get_url(name, request)} {width}w' for name, width in items
+        )
+        for extension, items in variants.items()
+    }
+
+
+def get_tags(recipe_ids):
+    tags = defaultdict(list)
+    for recipe_id, tag_id, name, color, slug in (
+        Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('tag__slug').values_list(
+            'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug'
+        )
+    ):
+        tags[recipe_id].append(
+            {'id': tag_id, 'name': name, 'color': color, 'slug': slug}
+        )
+
+    return tags
+
+
+def get_ingredients(recipe_ids):
+    ingredients = defaultdict(list)
+    for recipe_id, ingredient_id, name, measurement_unit, amount in (
+        RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('id').values_list(
+            'recipe_id',
+            'ingredient_id',
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'amount'
+        )
+    ):
+        ingredients[recipe_id].append({
+            'id': ingredient_id,
+            'name': name,
+            'measurement_unit': measurement_unit,
+            'amount': amount,
+        })
+
+    return ingredients
+
+
+def render_recipes(recipe_ids, request):
+    tags = get_tags(recipe_ids)
+    ingredients = get_ingredients(recipe_ids)
+    rendered = {}
+    for (
+        recipe_id, name, image, image_variants, text, cooking_time,
+        email, author_id, username, first_name, last_name
+    ) in Recipe.objects.filter(id__in=recipe_ids).order_by().values_list(
+        *RECIPE_FIELDS
+    ):
+        rendered[recipe_id] = {
+            'id': recipe_id,
+            'tags': tags[recipe_id],
+            'author': {
+                'email': email,
+                'id': author_id,
+                'username': username,
+                'first_name': first_name,
+                'last_name': last_name,
+                'is_subscribed': False,
+            },
+            'ingredients': ingredients[recipe_id],
+            'is_favorited': False,
+            'is_in_shopping_cart': False,
+            'name': name,
+            'image': get_url(image, request) if image else None,
+            'image_srcset': render_srcset(image_variants, request),
+            'text': text,
+            'cooking_time': cooking_time,
+        }
+
+    return rendered
@@ -0,0 +1,182 @@
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from threading import Lock
+
+from django.core.cache import cache
+
+from recipes.caching import (INGREDIENTS_VERSION, RECIPE_INGREDIENTS_VERSION,
+                             bump_version, get_version)
+from recipes.models import Ingredient, RecipeIngredient
+
+CHANGE_KEY = 'recipe_ingredients:change:{}'
+CHANGE_TIMEOUT = 60 * 60
+MAX_CHANGES = 1000
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._keys = ()
+        self._entries = ()
+
+    def build(self, version):
+        rows = sorted(
+            (normalize(name), measurement_unit, pk, name)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        keys = tuple(row[0] for row in rows)
+        entries = tuple(
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, measurement_unit, pk, name in rows
+        )
+        with self._lock:
+            self._version, self._keys, self._entries = version, keys, entries
+
+    def load(self):
+        version = get_version(INGREDIENTS_VERSION)
+        if self._version != version:
+            self.build(version)
+
+        with self._lock:
+            return self._keys, self._entries
+
+    def search(self, query):
+        keys, entries = self.load()
+        query = normalize(query)
+        start = end = bisect_left(keys, query)
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+
+        substring_matches = [
+            entry for index, (key, entry) in enumerate(zip(keys, entries))
+            if query in key and not start <= index < end
+        ]
+        return list(entries[start:end]) + substring_matches
+
+
+class RecipeIngredientIndex:
+    # Инвертированный индекс: ингредиент -> отсортированный массив id рецептов.
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._state = ({}, {})
+
+    def build(self, version):
+        postings = defaultdict(lambda: array('q'))
+        recipes = defaultdict(list)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).order_by('recipe_id').iterator():
+            postings[ingredient_id].append(recipe_id)
+            recipes[recipe_id].append(ingredient_id)
+
+        with self._lock:
+            self._version = version
+            self._state = (dict(postings), {
+                recipe_id: frozenset(ingredient_ids)
+                for recipe_id, ingredient_ids in recipes.items()
+            })
+
+    def load(self):
+        version = get_version(RECIPE_INGREDIENTS_VERSION)
+        if self._version != version and not self.catch_up(version):
+            self.build(version)
+
+        return self._state
+
+    def catch_up(self, version):
+        # Другие процессы публикуют id изменённых рецептов для каждой версии,
+        # при пропуске в журнале индекс перестраивается целиком.
+        current = self._version
+        if current is None or not 0 < version - current <= MAX_CHANGES:
+            return False
+
+        keys = [CHANGE_KEY.format(number)
+                for number in range(current + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+
+        recipes = self.get_ingredient_ids(set(changes.values()))
+        with self._lock:
+            if self._version != current:
+                return self._version is not None
+
+            self._state = self.apply(recipes)
+            self._version = version
+
+        return True
+
+    def get_ingredient_ids(self, recipe_ids):
+        recipes = {recipe_id: set() for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            recipes[recipe_id].add(ingredient_id)
+
+        return {
+            recipe_id: frozenset(ingredient_ids)
+            for recipe_id, ingredient_ids in recipes.items()
+        }
+
+    def refresh(self, recipe_id):
+        version = bump_version(RECIPE_INGREDIENTS_VERSION)
+        cache.set(CHANGE_KEY.format(version), recipe_id, CHANGE_TIMEOUT)
+        # Строки читаются после смены версии: более поздняя версия не может
+        # принести более старое состояние рецепта.
+        recipes = self.get_ingredient_ids({recipe_id})
+        with self._lock:
+            # Если пропущены чужие изменения, их подтянет load().
+            if self._version is None or self._version != version - 1:
+                return
+
+            self._state = self.apply(recipes)
+            self._version = version
+
+    def apply(self, changes):
+        postings, recipes = map(dict, self._state)
+        for recipe_id, ingredient_ids in changes.items():
+            current = recipes.pop(recipe_id, frozenset())
+            for ingredient_id in current - ingredient_ids:
+                posting = array('q', postings[ingredient_id])
+                del posting[bisect_left(posting, recipe_id)]
+                if posting:
+                    postings[ingredient_id] = posting
+                else:
+                    del postings[ingredient_id]
+
+            for ingredient_id in ingredient_ids - current:
+                posting = array('q', postings.get(ingredient_id, ()))
+                insort(posting, recipe_id)
+                postings[ingredient_id] = posting
+
+            if ingredient_ids:
+                recipes[recipe_id] = ingredient_ids
+
+        return postings, recipes
+
+    def search(self, ingredient_ids):
+        postings, recipes = self.load()
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(postings.get(ingredient_id, ()))
+
+        return sorted(
+            (
+                (recipe_id, count, len(recipes[recipe_id]) - count)
+                for recipe_id, count in matched.items()
+            ),
+            key=lambda item: (item[2], -item[1], -item[0])
+        )
+
+
+ingredient_index = IngredientIndex()
+recipe_ingredient_index = RecipeIngredientIndex()
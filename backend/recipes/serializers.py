@@ -1,22 +1,54 @@
 import base64
+import binascii
+import io
+import re
+import tempfile
+from collections import Counter
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.core.files import File
+from django.core.files.storage import default_storage
 from django.db import transaction
+from PIL import Image
 from rest_framework import serializers
-from rest_framework.relations import PrimaryKeyRelatedField
 
+from recipes.caching import favorite_ids, purchase_ids
+from recipes.images import generate_variants
 from recipes.models import (Favorite, Ingredient, Purchase, Recipe,
                             RecipeIngredient, Tag)
+from recipes.search import recipe_ingredient_index
 from users.serializers import UserSerializer
 
 User = get_user_model()
+NON_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
+
+
+class ImageSrcsetField(serializers.ReadOnlyField):
+    def to_representation(self, variants):
+        request = self.context.get('request')
+        return {
+            extension: ', '.join(
+                f'{self.get_url(name, request)} {width}w'
+                for name, width in items
+            )
+            for extension, items in variants.items()
+        }
+
+    def get_url(self, name, request):
+        url = default_storage.url(name)
+        if request is not None:
+            return request.build_absolute_uri(url)
+
+        return url
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
+    image_srcset = ImageSrcsetField(source='image_variants')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time',)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -51,6 +83,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_srcset = ImageSrcsetField(source='image_variants')
 
     class Meta:
         model = Recipe
@@ -63,42 +96,98 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_srcset',
             'text',
             'cooking_time'
         )
 
     def get_is_favorited(self, obj):
-        return bool(
-            self.context.get('request')
-            and self.context.get('request').user.is_authenticated
-            and Favorite.objects.filter(
-                user=self.context.get('request').user,
-                recipe=obj).exists()
-        )
+        return obj.id in favorite_ids.from_context(self.context)
 
     def get_is_in_shopping_cart(self, obj):
-        return bool(
-            self.context.get('request')
-            and self.context.get('request').user.is_authenticated
-            and Purchase.objects.filter(
-                user=self.context.get('request').user,
-                recipe=obj).exists()
-        )
+        return obj.id in purchase_ids.from_context(self.context)
 
 
 class Base64ImageField(serializers.ImageField):
+    default_error_messages = {
+        'too_large': 'Размер изображения превышает {max_size} байт.',
+        'too_many_pixels': (
+            'Изображение содержит больше {max_pixels} пикселей.'
+        ),
+    }
+    base64_marker = ';base64,'
+    chunk_size = 64 * 1024
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
-        return super().to_internal_value(data)
+            data = self.decode(data)
+
+        file = serializers.FileField.to_internal_value(self, data)
+        self.check_image(file)
+        return file
+
+    def decode(self, data):
+        marker_position = data.find(self.base64_marker)
+        if marker_position == -1:
+            self.fail('invalid_image')
+
+        ext = data[:marker_position].split('/')[-1]
+        start = marker_position + len(self.base64_marker)
+        if (len(data) - start) * 3 // 4 > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.fail('too_large', max_size=settings.IMAGE_UPLOAD_MAX_SIZE)
+
+        file = tempfile.TemporaryFile()
+        pending = ''
+        try:
+            for offset in range(start, len(data), self.chunk_size):
+                # Куски декодируются по границе групп из 4 символов,
+                # переносы строк и пробелы отбрасываются, как в b64decode.
+                pending += NON_BASE64.sub(
+                    '', data[offset:offset + self.chunk_size]
+                )
+                usable = len(pending) - len(pending) % 4
+                chunk = base64.b64decode(pending[:usable])
+                pending = pending[usable:]
+                if not file.tell():
+                    self.check_pixels(io.BytesIO(chunk), header_only=True)
+
+                file.write(chunk)
+
+            file.write(base64.b64decode(pending))
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('invalid_image')
+        except serializers.ValidationError:
+            file.close()
+            raise
+
+        file.flush()
+        return File(file, name='temp.' + ext)
+
+    def check_image(self, file):
+        file.seek(0)
+        self.check_pixels(file)
+        file.seek(0)
+
+    def check_pixels(self, file, header_only=False):
+        max_pixels = settings.IMAGE_UPLOAD_MAX_PIXELS
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            self.fail('too_many_pixels', max_pixels=max_pixels)
+        except (OSError, SyntaxError, ValueError):
+            if header_only:
+                return
+
+            self.fail('invalid_image')
+
+        if width * height > max_pixels:
+            self.fail('too_many_pixels', max_pixels=max_pixels)
 
 
 class CreateUpdateRecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredient
@@ -109,7 +198,7 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
     ingredients = CreateUpdateRecipeIngredientSerializer(
         source='recipeingredient_set', many=True
     )
-    tags = PrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageField()
 
     class Meta:
@@ -127,33 +216,55 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
     def validate(self, attrs):
         ingredients = attrs.get('recipeingredient_set')
         tags = attrs.get('tags')
-        if not ingredients:
+        if not ingredients and self.is_required(attrs, 'recipeingredient_set'):
             raise serializers.ValidationError(
                 'Список ингредиентов не может быть пустым'
             )
 
-        if not tags:
+        if not tags and self.is_required(attrs, 'tags'):
             raise serializers.ValidationError(
                 'Список тэгов не может быть пустым'
             )
 
-        self.check_duplicates(ingredients, 'ингредиенты')
-        self.check_duplicates(tags, 'тэги')
+        ingredient_ids = [ingredient['id'] for ingredient in ingredients or []]
+        self.check_duplicates(ingredient_ids, 'ингредиенты')
+        self.check_duplicates(tags or [], 'тэги')
+
+        errors = {}
+        unknown_ingredients = self.get_unknown_ids(ingredient_ids, Ingredient)
+        if unknown_ingredients:
+            errors['ingredients'] = (
+                f'Ингредиенты не найдены: {unknown_ingredients}'
+            )
+
+        unknown_tags = self.get_unknown_ids(tags or [], Tag)
+        if unknown_tags:
+            errors['tags'] = f'Тэги не найдены: {unknown_tags}'
+
+        if errors:
+            raise serializers.ValidationError(errors)
 
         return attrs
 
-    def check_duplicates(self, data, key_word):
-        if not len(data) > 1:
-            return data
+    def is_required(self, attrs, source):
+        return not self.partial or source in attrs
 
-        check_list = list()
-        for item in data:
-            if item in check_list:
-                raise serializers.ValidationError(
-                    f'Нельзя дублировать {key_word}'
-                )
+    def check_duplicates(self, ids, key_word):
+        duplicates = sorted(
+            item_id for item_id, count in Counter(ids).items() if count > 1
+        )
+        if duplicates:
+            raise serializers.ValidationError(
+                f'Нельзя дублировать {key_word}: {duplicates}'
+            )
 
-            check_list.append(item)
+    def get_unknown_ids(self, ids, model):
+        if not ids:
+            return []
+
+        return sorted(set(ids) - set(
+            model.objects.filter(id__in=ids).values_list('id', flat=True)
+        ))
 
     @transaction.atomic
     def create(self, validated_data):
@@ -165,32 +276,96 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
         self.bind_ingresient_recipe(ingredients_data, recipe)
 
         recipe.tags.set(tags_data)
+        self.generate_variants(recipe)
+        self.refresh_ingredient_index(recipe)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients_data = validated_data.pop('recipeingredient_set')
-        tags_data = validated_data.pop('tags')
-        instance.tags.clear()
-        instance.tags.set(tags_data)
-
-        instance.ingredients.clear()
-        self.bind_ingresient_recipe(ingredients_data, instance)
-
-        return super().update(instance, validated_data)
+        ingredients_data = validated_data.pop('recipeingredient_set', None)
+        tags_data = validated_data.pop('tags', None)
+        if tags_data is not None:
+            instance.tags.set(tags_data)
+
+        if ingredients_data is not None:
+            self.update_recipe_ingredients(ingredients_data, instance)
+            self.refresh_ingredient_index(instance)
+
+        instance = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            self.generate_variants(instance)
+
+        return instance
+
+    def generate_variants(self, recipe):
+        # Заголовок проверен при разборе, битое тело выясняется только тут.
+        try:
+            generate_variants(recipe)
+        except (OSError, SyntaxError, ValueError):
+            raise serializers.ValidationError({
+                'image': self.fields['image'].error_messages['invalid_image']
+            })
 
     def bind_ingresient_recipe(self, ingredients_data, recipe):
         recipe_ingredients = [
             RecipeIngredient(
                 recipe=recipe,
-                ingredient=ingredient_data['id'],
+                ingredient_id=ingredient_data['id'],
                 amount=ingredient_data['amount']
             ) for ingredient_data in ingredients_data
         ]
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
 
+    def refresh_ingredient_index(self, recipe):
+        recipe_id = recipe.id
+        transaction.on_commit(
+            lambda: recipe_ingredient_index.refresh(recipe_id)
+        )
+
+    def update_recipe_ingredients(self, ingredients_data, recipe):
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipeingredient_set.all()
+        }
+        incoming = {
+            ingredient_data['id']: ingredient_data
+            for ingredient_data in ingredients_data
+        }
+        removed = current.keys() - incoming.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+
+        changed = []
+        for ingredient_id, ingredient_data in incoming.items():
+            recipe_ingredient = current.get(ingredient_id)
+            if (recipe_ingredient is not None
+                    and recipe_ingredient.amount != ingredient_data['amount']):
+                recipe_ingredient.amount = ingredient_data['amount']
+                changed.append(recipe_ingredient)
+
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+
+        self.bind_ingresient_recipe(
+            [
+                ingredient_data
+                for ingredient_id, ingredient_data in incoming.items()
+                if ingredient_id not in current
+            ],
+            recipe
+        )
+
     def to_representation(self, instance):
-        return RecipeSerializer(instance).data
+        instance = Recipe.objects.with_related().get(pk=instance.pk)
+        return RecipeSerializer(instance, context=self.context).data
+
+
+class CookableQuerySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False
+    )
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -0,0 +1,124 @@
+from django.db import connections, transaction
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from recipes import counters, fulltext, storage
+from recipes.caching import (INGREDIENTS_VERSION, RECIPE_INGREDIENTS_VERSION,
+                             RECIPE_VERSION, RECIPES_VERSION, TAGS_VERSION,
+                             USER_VERSION, bump_version, favorite_ids,
+                             purchase_ids)
+from recipes.models import Favorite, Ingredient, Purchase, Recipe, Tag
+from recipes.search import recipe_ingredient_index
+from users.models import User
+
+
+def recipes_changed(*version_names):
+    # Новое поколение кэша рецептов появляется только после коммита.
+    def bump():
+        for name in (RECIPES_VERSION, *version_names):
+            bump_version(name)
+
+    transaction.on_commit(bump)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(**kwargs):
+    recipes_changed(INGREDIENTS_VERSION)
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(**kwargs):
+    # Каскад удаляет строки рецептов без сигналов, индекс строится заново.
+    recipes_changed(RECIPE_INGREDIENTS_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(**kwargs):
+    recipes_changed(TAGS_VERSION)
+
+
+@receiver(post_save, sender=User)
+def user_changed(instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        recipes_changed(USER_VERSION.format(instance.id))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, **kwargs):
+    if created:
+        counters.change(User, instance.author_id, 'recipes_count', 1)
+
+    recipes_changed(RECIPE_VERSION.format(instance.id))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    counters.change(User, instance.author_id, 'recipes_count', -1)
+    recipes_changed(RECIPE_VERSION.format(instance.id))
+    recipe_id = instance.id
+    transaction.on_commit(lambda: recipe_ingredient_index.refresh(recipe_id))
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(instance, created, **kwargs):
+    if created:
+        counters.change(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(instance, **kwargs):
+    counters.change(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def favorite_ids_changed(instance, **kwargs):
+    favorite_ids.invalidate(instance.user_id)
+
+
+@receiver((post_save, post_delete), sender=Purchase)
+def purchase_ids_changed(instance, **kwargs):
+    purchase_ids.invalidate(instance.user_id)
+
+
+@receiver(post_migrate)
+def ensure_fulltext_search(sender, using, **kwargs):
+    # SQLite пересоздаёт таблицу при миграциях и теряет триггеры поиска.
+    connection = connections[using]
+    if (sender.name == 'recipes'
+            and 'recipes_recipe' in connection.introspection.table_names()
+            and not fulltext.is_installed(connection)):
+        fulltext.install(connection)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_media(instance, update_fields=None, **kwargs):
+    instance._stored_media = None
+    if (update_fields is not None
+            and not {'image', 'image_variants'} & set(update_fields)):
+        return
+
+    stored = Recipe.objects.filter(pk=instance.pk).values_list(
+        'image', 'image_variants'
+    ).first() if instance.pk else None
+    instance._stored_media = storage.get_media_names(*stored or (None, None))
+
+
+@receiver(post_save, sender=Recipe)
+def track_media(instance, **kwargs):
+    stored = getattr(instance, '_stored_media', None)
+    if stored is None:
+        return
+
+    current = storage.get_media_names(
+        instance.image.name, instance.image_variants
+    )
+    storage.retain(current - stored)
+    storage.release(stored - current)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_media(instance, **kwargs):
+    storage.release(storage.get_media_names(
+        instance.image.name, instance.image_variants
+    ))
@@ -0,0 +1,108 @@
+import hashlib
+import os
+from collections import Counter
+
+from django.apps import apps as django_apps
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils import timezone
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Имя файла — sha256 содержимого, одинаковые загрузки хранятся один раз.
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+
+        content.seek(0)
+        checksum = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        name = os.path.join(
+            directory, checksum[:2], checksum + extension
+        ).replace('\\', '/')
+        touch(name)
+        if self.exists(name):
+            return name
+
+        return super().save(name, content, max_length)
+
+
+def get_media_names(image_name, image_variants):
+    names = {image_name} if image_name else set()
+    names.update(
+        name for items in (image_variants or {}).values()
+        for name, _ in items
+    )
+    return names
+
+
+def touch(name):
+    # Свежая отметка не даёт clean_media удалить файл, пока рецепт со ссылкой
+    # на него не сохранён; clean_media удаляет файл под блокировкой строки.
+    MediaFile = django_apps.get_model('recipes', 'MediaFile')
+    if not MediaFile.objects.filter(name=name).update(
+        updated_at=timezone.now()
+    ):
+        MediaFile.objects.bulk_create(
+            [MediaFile(name=name)], ignore_conflicts=True
+        )
+
+
+def retain(names):
+    if not names:
+        return
+
+    MediaFile = django_apps.get_model('recipes', 'MediaFile')
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name) for name in names], ignore_conflicts=True
+    )
+    MediaFile.objects.filter(name__in=names).update(
+        references=F('references') + 1, updated_at=timezone.now()
+    )
+
+
+def release(names):
+    if not names:
+        return
+
+    MediaFile = django_apps.get_model('recipes', 'MediaFile')
+    MediaFile.objects.filter(name__in=names, references__gt=0).update(
+        references=F('references') - 1, updated_at=timezone.now()
+    )
+
+
+def reconcile(apps):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    MediaFile = apps.get_model('recipes', 'MediaFile')
+    actual = Counter()
+    for image_name, image_variants in Recipe.objects.values_list(
+        'image', 'image_variants'
+    ).iterator():
+        actual.update(get_media_names(image_name, image_variants))
+
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name) for name in actual], ignore_conflicts=True
+    )
+    changed = [
+        media_file for media_file in MediaFile.objects.only(
+            'id', 'name', 'references'
+        ).iterator()
+        if media_file.references != actual[media_file.name]
+    ]
+    for media_file in changed:
+        media_file.references = actual[media_file.name]
+        media_file.updated_at = timezone.now()
+
+    MediaFile.objects.bulk_update(
+        changed, ('references', 'updated_at'), batch_size=1000
+    )
+    return len(changed)
@@ -0,0 +1,627 @@
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from recipes import rendering, storage
+from recipes.caching import (INGREDIENTS_VERSION, RECIPE_INGREDIENTS_VERSION,
+                             TAGS_VERSION, bump_version, get_version)
+from recipes.fragments import USER_ID_SETS
+from recipes.images import generate_variants
+from recipes.models import (Favorite, Ingredient, MediaFile, Purchase, Recipe,
+                            RecipeIngredient, Tag)
+from recipes.search import RecipeIngredientIndex
+from recipes.serializers import RecipeSerializer
+from users.authentication import get_token_cache_key
+from users.models import Subscription, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(width, height, color='orange'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name='recipe.png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeFixtureTestCase(TestCase):
+    recipes_per_author = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(
+                email=f'author{index}@example.com',
+                username=f'author{index}',
+                first_name='Автор',
+                last_name=str(index),
+                password='password-123'
+            )
+            for index in range(2)
+        ]
+        cls.reader = User.objects.create_user(
+            email='reader@example.com',
+            username='reader',
+            first_name='Читатель',
+            last_name='Рецептов',
+            password='password-123'
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {index}', color=f'#00000{index}', slug=f'tag{index}'
+            )
+            for index in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г'
+            )
+            for index in range(8)
+        ]
+        cls.recipes = []
+        for index in range(cls.recipes_per_author * len(cls.authors)):
+            recipe = Recipe.objects.create(
+                author=cls.authors[index % len(cls.authors)],
+                name=f'Рецепт {index}',
+                image=make_image(600, 400),
+                text='Описание рецепта',
+                cooking_time=index + 1
+            )
+            recipe.tags.set(cls.tags[:index % len(cls.tags) + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=offset + 1
+                )
+                for offset, ingredient in enumerate(
+                    cls.ingredients[:index % 4 + 2]
+                )
+            )
+            generate_variants(recipe)
+            cls.recipes.append(recipe)
+            Favorite.objects.create(user=cls.reader, recipe=recipe)
+            Purchase.objects.create(user=cls.reader, recipe=recipe)
+
+        for author in cls.authors:
+            Subscription.objects.create(
+                subscriber=cls.reader, subscribed_to=author
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Кэш не откатывается вместе с транзакцией теста.
+        cache.clear()
+        token = Token.objects.create(user=self.reader)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def get_with_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def assertSameQueries(self, url, other_url):
+        _, num_queries = self.get_with_queries(url)
+        cache.clear()
+        with self.assertNumQueries(num_queries):
+            response = self.client.get(other_url)
+
+        self.assertEqual(response.status_code, 200)
+        return response
+
+
+class RecipeQueriesTest(RecipeFixtureTestCase):
+    def test_page_size_does_not_change_queries(self):
+        response = self.assertSameQueries(
+            '/api/recipes/?limit=2', '/api/recipes/?limit=10'
+        )
+        results = response.json()['results']
+        self.assertEqual(len(results), 10)
+        for recipe in results:
+            self.assertTrue(recipe['is_favorited'])
+            self.assertTrue(recipe['is_in_shopping_cart'])
+
+    def test_recipe_size_does_not_change_detail_queries(self):
+        small, large = self.recipes[0], self.recipes[-1]
+        response = self.assertSameQueries(
+            f'/api/recipes/{small.id}/', f'/api/recipes/{large.id}/'
+        )
+        recipe = response.json()
+        self.assertEqual(len(recipe['tags']), 3)
+        self.assertEqual(len(recipe['ingredients']), 5)
+        self.assertTrue(recipe['author']['is_subscribed'])
+
+
+class SubscriptionListQueriesTest(RecipeFixtureTestCase):
+    def test_page_size_does_not_change_queries(self):
+        response = self.assertSameQueries(
+            '/api/users/subscriptions/?limit=1&recipes_limit=1',
+            '/api/users/subscriptions/?limit=2&recipes_limit=5'
+        )
+        results = response.json()['results']
+        self.assertEqual(len(results), 2)
+        for author in results:
+            self.assertEqual(len(author['recipes']), 5)
+            self.assertEqual(
+                author['recipes_count'], self.recipes_per_author
+            )
+
+    def test_no_subscriptions_with_recipes_limit(self):
+        Subscription.objects.filter(subscriber=self.reader).delete()
+        response = self.client.get(
+            '/api/users/subscriptions/?recipes_limit=3'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+
+class RecipeRenderingContractTest(RecipeFixtureTestCase):
+    def render_serializer(self, request, **context):
+        return {
+            recipe['id']: JSONRenderer().render(recipe)
+            for recipe in RecipeSerializer(
+                Recipe.objects.with_related(),
+                many=True,
+                context={'request': request, **context}
+            ).data
+        }
+
+    def test_rows_match_serializer(self):
+        request = RequestFactory().get('/')
+        expected = self.render_serializer(request, **{
+            id_set.context_key: frozenset() for id_set in USER_ID_SETS
+        })
+        actual = rendering.render_recipes(list(expected), request)
+        self.assertTrue(all(
+            recipe.image_variants for recipe in Recipe.objects.all()
+        ))
+        for recipe_id, content in expected.items():
+            with self.subTest(recipe_id=recipe_id):
+                self.assertEqual(
+                    JSONRenderer().render(actual[recipe_id]), content
+                )
+
+    def test_list_matches_serializer(self):
+        response = self.client.get('/api/recipes/?limit=100')
+        expected = self.render_serializer(response.wsgi_request)
+        results = response.json()['results']
+        self.assertEqual(len(results), len(expected))
+        for recipe in results:
+            with self.subTest(recipe_id=recipe['id']):
+                self.assertEqual(
+                    JSONRenderer().render(recipe), expected[recipe['id']]
+                )
+
+
+class CookableTest(RecipeFixtureTestCase):
+    def get_missing(self, ingredients):
+        response = self.client.get('/api/recipes/cookable/', {
+            'ingredients': [ingredient.id for ingredient in ingredients],
+            'limit': 100,
+        })
+        self.assertEqual(response.status_code, 200)
+        return {
+            recipe['id']: recipe['missing_ingredients']
+            for recipe in response.json()['results']
+        }
+
+    def test_deleted_ingredient_is_not_required(self):
+        available = self.ingredients[:4]
+        recipe = self.recipes[3]
+        self.assertEqual(self.get_missing(available)[recipe.id], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredients[4].delete()
+
+        self.assertEqual(self.get_missing(available)[recipe.id], 0)
+
+
+class ShoppingCartTest(RecipeFixtureTestCase):
+    url = '/api/recipes/download_shopping_cart/'
+
+    def test_etag_changes_with_ingredient(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code,
+            304
+        )
+        ingredient = self.ingredients[0]
+        ingredient.measurement_unit = 'кг'
+        ingredient.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('кг', b''.join(response.streaming_content).decode())
+
+
+class CursorPaginationTest(RecipeFixtureTestCase):
+    def test_cursor_keeps_default_order_only(self):
+        for query in (
+            '', '&ordering=-created_at', '&ordering=-created_at,-id'
+        ):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/recipes/?cursor={query}')
+                self.assertEqual(response.status_code, 200)
+
+        for query in ('&search=Рецепт', '&ordering=-favorites_count'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/recipes/?cursor={query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('cursor', response.json())
+
+
+class LoadIngredientsTest(TestCase):
+    def load(self, suffix, content, *args):
+        with tempfile.NamedTemporaryFile(
+            'w', suffix=suffix, encoding='utf-8'
+        ) as file:
+            file.write(content)
+            file.flush()
+            call_command(
+                'load_ingredients', file.name, *args, stdout=io.StringIO()
+            )
+
+    def test_loads_csv(self):
+        self.load('.csv', 'Соль,г\nСахар,г\nСоль,г\n')
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_loads_json_across_chunks(self):
+        items = [
+            {'name': f'Ингредиент {index}', 'measurement_unit': 'г'}
+            for index in range(50)
+        ]
+        with mock.patch(
+            'recipes.management.commands.load_ingredients.CHUNK_SIZE', 16
+        ):
+            self.load('.json', json.dumps(items, ensure_ascii=False, indent=1))
+
+        self.assertEqual(Ingredient.objects.count(), 50)
+
+    def test_batch_size_must_be_positive(self):
+        for batch_size in ('0', '-1'):
+            with self.subTest(batch_size=batch_size):
+                with self.assertRaises(CommandError):
+                    self.load('.csv', 'Соль,г\n', '--batch-size', batch_size)
+
+        self.assertFalse(Ingredient.objects.exists())
+
+    def test_unknown_format_fails(self):
+        with self.assertRaisesMessage(CommandError, 'csv, json'):
+            self.load('.txt', 'Соль,г\n')
+
+    def test_invalid_file_fails(self):
+        with self.assertRaises(CommandError):
+            self.load('.json', '[{"name": "Соль"}]')
+
+        self.assertFalse(Ingredient.objects.exists())
+
+
+class RecipeImageTest(RecipeFixtureTestCase):
+    def get_payload(self, image_format):
+        buffer = io.BytesIO()
+        Image.frombytes('RGB', (200, 200), os.urandom(200 * 200 * 3)).save(
+            buffer, image_format
+        )
+        content = buffer.getvalue()
+        return 'data:image/{};base64,{}'.format(
+            image_format.lower(),
+            base64.b64encode(content[:len(content) // 2]).decode()
+        )
+
+    def test_truncated_image_is_rejected(self):
+        recipe = self.recipes[0]
+        author = APIClient()
+        author.force_authenticate(recipe.author)
+        for image_format in ('PNG', 'JPEG'):
+            with self.subTest(image_format=image_format):
+                response = self.client.post('/api/recipes/', {
+                    'ingredients': [
+                        {'id': self.ingredients[0].id, 'amount': 1}
+                    ],
+                    'tags': [self.tags[0].id],
+                    'image': self.get_payload(image_format),
+                    'name': 'Рецепт',
+                    'text': 'Описание',
+                    'cooking_time': 5,
+                }, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('image', response.json())
+
+                response = author.patch(f'/api/recipes/{recipe.id}/', {
+                    'image': self.get_payload(image_format)
+                }, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('image', response.json())
+
+
+class CountersTest(RecipeFixtureTestCase):
+    def test_counters_follow_writes(self):
+        recipe, author = self.recipes[0], self.authors[0]
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        author.refresh_from_db()
+        self.assertEqual(author.recipes_count, self.recipes_per_author)
+        self.assertEqual(author.subscribers_count, 1)
+
+        Favorite.objects.filter(recipe=recipe).delete()
+        Subscription.objects.filter(subscribed_to=author).delete()
+        Recipe.objects.filter(pk=self.recipes[2].pk).delete()
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+        self.assertEqual(author.recipes_count, self.recipes_per_author - 1)
+        self.assertEqual(author.subscribers_count, 0)
+
+    def test_full_save_keeps_concurrent_changes(self):
+        recipe = Recipe.objects.get(pk=self.recipes[0].pk)
+        author = User.objects.get(pk=self.authors[0].pk)
+        other = User.objects.create_user(
+            email='other@example.com', username='other',
+            first_name='Другой', last_name='Читатель', password='pw-123456'
+        )
+        Favorite.objects.create(user=other, recipe=recipe)
+        Subscription.objects.create(subscriber=other, subscribed_to=author)
+        recipe.name = 'Новое название'
+        recipe.save()
+        author.first_name = 'Новое имя'
+        author.save()
+
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 2)
+        self.assertEqual(author.first_name, 'Новое имя')
+        self.assertEqual(author.subscribers_count, 2)
+
+    def test_reconcile_counters(self):
+        recipe, author = self.recipes[0], self.authors[0]
+        Recipe.objects.filter(pk=recipe.pk).update(favorites_count=7)
+        User.objects.filter(pk=author.pk).update(
+            recipes_count=0, subscribers_count=5
+        )
+        call_command('reconcile_counters', stdout=io.StringIO())
+
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(author.recipes_count, self.recipes_per_author)
+        self.assertEqual(author.subscribers_count, 1)
+
+
+class CacheVersionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_catalog_versions_change_after_commit(self):
+        for version_name, create in (
+            (INGREDIENTS_VERSION, lambda: Ingredient.objects.create(
+                name='Соль', measurement_unit='г'
+            )),
+            (TAGS_VERSION, lambda: Tag.objects.create(
+                name='Завтрак', color='#ffffff', slug='breakfast'
+            )),
+        ):
+            with self.subTest(version_name=version_name):
+                version = get_version(version_name)
+                with self.captureOnCommitCallbacks(execute=True):
+                    create().delete()
+                    self.assertEqual(get_version(version_name), version)
+
+                self.assertNotEqual(get_version(version_name), version)
+
+
+class TokenAuthenticationTest(RecipeFixtureTestCase):
+    url = '/api/users/me/'
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        cache_key = get_token_cache_key(self.reader.auth_token.key)
+        cached = cache.get(cache_key)
+        self.assertIsNotNone(cached)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.is_active = False
+            self.reader.save()
+            # Параллельный запрос до коммита видит ещё активного пользователя.
+            cache.set(cache_key, cached)
+
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class RecipeIngredientIndexTest(RecipeFixtureTestCase):
+    def search(self, index):
+        return index.search(
+            [ingredient.id for ingredient in self.ingredients[:3]]
+        )
+
+    def test_other_process_applies_changes_incrementally(self):
+        writer, reader = RecipeIngredientIndex(), RecipeIngredientIndex()
+        writer.load()
+        reader.load()
+        recipe = self.recipes[5]
+        RecipeIngredient.objects.filter(recipe=recipe).delete()
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=self.ingredients[0], amount=1
+        )
+        writer.refresh(recipe.id)
+
+        with mock.patch.object(reader, 'build') as build:
+            reader.load()
+
+        build.assert_not_called()
+
+        expected = RecipeIngredientIndex()
+        self.assertEqual(self.search(reader), self.search(expected))
+        self.assertEqual(self.search(writer), self.search(expected))
+        self.assertIn((recipe.id, 1, 0), self.search(reader))
+
+    def test_gap_in_versions_rebuilds(self):
+        reader = RecipeIngredientIndex()
+        reader.load()
+        RecipeIngredient.objects.filter(
+            ingredient=self.ingredients[0]
+        ).delete()
+        bump_version(RECIPE_INGREDIENTS_VERSION)
+        self.assertEqual(
+            self.search(reader), self.search(RecipeIngredientIndex())
+        )
+
+
+class MediaStorageTest(RecipeFixtureTestCase):
+    def get_references(self, recipe):
+        recipe.refresh_from_db()
+        return dict(MediaFile.objects.filter(
+            name__in=storage.get_media_names(
+                recipe.image.name, recipe.image_variants
+            )
+        ).values_list('name', 'references'))
+
+    def expire(self):
+        MediaFile.objects.filter(references=0).update(
+            updated_at=timezone.now() - timedelta(days=2)
+        )
+
+    def test_identical_uploads_share_file(self):
+        names = set(Recipe.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertRegex(
+            names.pop(), r'^recipes/images/[0-9a-f]{2}/[0-9a-f]{64}\.png$'
+        )
+        references = self.get_references(self.recipes[0])
+        self.assertEqual(len(references), 1 + 3 * 2)
+        self.assertEqual(
+            set(references.values()), {len(self.recipes)}
+        )
+
+    def test_references_follow_replace_and_delete(self):
+        recipe = self.recipes[0]
+        shared = self.get_references(recipe)
+        recipe.image = make_image(300, 200, 'green')
+        recipe.save()
+        generate_variants(recipe)
+        own = self.get_references(recipe)
+        self.assertEqual(set(own.values()), {1})
+        self.assertEqual(
+            set(MediaFile.objects.filter(name__in=shared).values_list(
+                'references', flat=True
+            )),
+            {len(self.recipes) - 1}
+        )
+
+        recipe.delete()
+        self.assertEqual(
+            set(MediaFile.objects.filter(name__in=own).values_list(
+                'references', flat=True
+            )),
+            {0}
+        )
+        self.expire()
+        call_command('clean_media', '--delete', stdout=io.StringIO())
+        for name in own:
+            self.assertFalse(default_storage.exists(name))
+
+        for name in shared:
+            self.assertTrue(default_storage.exists(name))
+
+    def test_clean_media_spares_reuploaded_file(self):
+        recipe = self.recipes[0]
+        recipe.image = make_image(300, 200, 'green')
+        recipe.save()
+        name = recipe.image.name
+        recipe.delete()
+        self.expire()
+        self.assertEqual(
+            default_storage.save(
+                'recipes/images/x.png', make_image(300, 200, 'green')
+            ),
+            name
+        )
+        call_command('clean_media', '--delete', stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(name))
+        self.assertTrue(MediaFile.objects.filter(name=name).exists())
+
+
+class RecipeUpdateTest(RecipeFixtureTestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[-1]
+        self.author = APIClient()
+        self.author.force_authenticate(self.recipe.author)
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def patch_with_statements(self, data, *tables):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.author.patch(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            query['sql'].split()[0] for query in queries.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+            and any(f'"{table}"' in query['sql'] for table in tables)
+        ]
+
+    def test_text_only_patch_keeps_relations(self):
+        statements = self.patch_with_statements(
+            {'text': 'Новое описание'},
+            'recipes_recipeingredient', 'recipes_recipe_tags'
+        )
+        self.assertEqual(statements, [])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.text, 'Новое описание')
+
+    def test_amount_change_is_one_bulk_update(self):
+        rows = self.recipe.recipeingredient_set.order_by('id').values_list(
+            'ingredient_id', 'amount'
+        )
+        ingredients = [
+            {'id': ingredient_id, 'amount': amount}
+            for ingredient_id, amount in rows
+        ]
+        ingredients[0]['amount'] += 10
+        statements = self.patch_with_statements(
+            {'ingredients': ingredients}, 'recipes_recipeingredient'
+        )
+        self.assertEqual(statements, ['UPDATE'])
+        self.assertEqual(
+            self.recipe.recipeingredient_set.get(
+                ingredient_id=ingredients[0]['id']
+            ).amount,
+            ingredients[0]['amount']
+        )
+
+    def test_unknown_ids_are_reported_together(self):
+        missing = Ingredient.objects.order_by('-id').first().id + 1
+        missing_tag = Tag.objects.order_by('-id').first().id + 1
+        response = self.author.patch(self.url, {
+            'ingredients': [
+                {'id': self.ingredients[0].id, 'amount': 1},
+                {'id': missing + 1, 'amount': 1},
+                {'id': missing, 'amount': 1},
+            ],
+            'tags': [self.tags[0].id, missing_tag],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertIn(str([missing, missing + 1]), str(errors['ingredients']))
+        self.assertIn(str([missing_tag]), str(errors['tags']))
@@ -1,42 +1,139 @@
-import csv
-from io import StringIO
+import hashlib
 
-import django_filters
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Sum
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django_filters import filters
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from recipes.filters import RecipeFilter
+from recipes.caching import (INGREDIENTS_VERSION, RECIPES_VERSION,
+                             TAGS_VERSION, Snapshot, get_version)
+from recipes.filters import RecipeFilter, TiebreakOrderingFilter
+from recipes.fragments import render_recipes
 from recipes.models import (Favorite, Ingredient, Purchase, Recipe,
                             RecipeIngredient, Tag)
 from recipes.permissions import AuthAuthorOrReadOnly
-from recipes.serializers import (CreateUpdateRecipeSerializer,
+from recipes.renderers import (CSVShoppingCartRenderer,
+                               JSONShoppingCartRenderer,
+                               TextShoppingCartRenderer)
+from recipes.search import ingredient_index, recipe_ingredient_index
+from recipes.serializers import (CookableQuerySerializer,
+                                 CreateUpdateRecipeSerializer,
                                  FavoriteSerializer, IngredientSerializer,
                                  PurchaseSerializer, RecipeSerializer,
                                  TagSerializer)
-from users.paginations import PageNumberLimitPagination
+from users.paginations import (PageNumberLimitPagination,
+                               PageNumberOrCursorPagination)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class SnapshotListMixin:
+    snapshot = None
+
+    def list(self, request, *args, **kwargs):
+        content, etag = self.snapshot.get()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type='application/json')
+
+        response['ETag'] = etag
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.CATALOG_CACHE_MAX_AGE,
+            must_revalidate=True
+        )
+        return response
+
+
+class AnonymousListCacheMixin:
+    list_cache_version = None
+    list_cache_key = 'list:{version_name}:{version}:{digest}'
+
+    def list(self, request, *args, **kwargs):
+        if (request.user.is_authenticated
+                or request.accepted_renderer.format != 'json'):
+            return super().list(request, *args, **kwargs)
+
+        key = self.get_list_cache_key(request)
+        content = cache.get(key)
+        cache_status = 'HIT'
+        if content is None:
+            cache_status = 'MISS'
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+            content = request.accepted_renderer.render(
+                response.data,
+                request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            cache.set(key, content, settings.RECIPES_CACHE_TIMEOUT)
+
+        response = HttpResponse(content, content_type='application/json')
+        response['X-Cache'] = cache_status
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def get_list_cache_key(self, request):
+        query = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+            if any(values)
+        )
+        digest = hashlib.md5(
+            repr((request.build_absolute_uri('/'), query)).encode()
+        ).hexdigest()
+        return self.list_cache_key.format(
+            version_name=self.list_cache_version,
+            version=get_version(self.list_cache_version),
+            digest=digest
+        )
+
+
+class RecipeFragmentMixin:
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(render_recipes(page, request))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(render_recipes([self.get_object()], request)[0])
+
+
+class TagViewSet(SnapshotListMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     queryset = Tag.objects.all()
+    snapshot = Snapshot(
+        TAGS_VERSION,
+        lambda: JSONRenderer().render(
+            TagSerializer(Tag.objects.all(), many=True).data
+        )
+    )
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(AnonymousListCacheMixin, RecipeFragmentMixin,
+                    ModelViewSet):
     serializer_class = RecipeSerializer
     permission_classes = (AuthAuthorOrReadOnly,)
-    pagination_class = PageNumberLimitPagination
+    pagination_class = PageNumberOrCursorPagination
     queryset = Recipe.objects.all()
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, TiebreakOrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('favorites_count', 'created_at',)
+    ordering_tiebreak = ('-created_at', '-id',)
+    list_cache_version = RECIPES_VERSION
     http_method_names = ('get', 'post', 'patch', 'delete',)
 
     def get_serializer_class(self):
@@ -48,48 +145,86 @@ class RecipeViewSet(ModelViewSet):
     @action(
         permission_classes=(IsAuthenticated,),
         methods=['GET'],
-        detail=False
+        detail=False,
+        renderer_classes=(
+            CSVShoppingCartRenderer,
+            TextShoppingCartRenderer,
+            JSONShoppingCartRenderer,
+        )
     )
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
+        cart = RecipeIngredient.objects.filter(
             recipe__purchases__user=request.user
-        ).values(
+        )
+        renderer = request.accepted_renderer
+        etag = quote_etag(self.get_cart_etag(cart, renderer.format))
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        ingredients = cart.values(
             'ingredient__name',
             'ingredient__measurement_unit'
         ).annotate(
             ingredient_amount=Sum('amount')
-        ).order_by('ingredient__name')
-
-        result = list()
-        for ingredient in ingredients:
-            result.append([
-                ingredient.get('ingredient__name'),
-                ingredient.get('ingredient_amount'),
-                ingredient.get('ingredient__measurement_unit')
-            ]
-            )
+        ).order_by('ingredient__name').values_list(
+            'ingredient__name',
+            'ingredient_amount',
+            'ingredient__measurement_unit'
+        )
 
-        try:
-            csv_buffer = StringIO()
-            writer = csv.writer(csv_buffer)
-            writer.writerows(result)
-            response = HttpResponse(
-                csv_buffer.getvalue(),
-                content_type='application/octet-stream'
-            )
-            response['Content-Disposition'] = \
-                f'attachment; filename="my_cart_{request.user.username}"'
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients.iterator()),
+            content_type=f'{renderer.media_type}; charset=utf-8'
+        )
+        response['ETag'] = etag
+        response['Content-Disposition'] = (
+            'attachment; '
+            f'filename="my_cart_{request.user.username}.{renderer.format}"'
+        )
+        return response
 
-        except Exception as e:
-            response = {
-                'message': f'Ошибка при создании/отправке файла: {str(e)}'
+    @action(methods=['GET'], detail=False)
+    def cookable(self, request):
+        query = CookableQuerySerializer(data={
+            'ingredients': request.query_params.getlist('ingredients')
+        })
+        query.is_valid(raise_exception=True)
+        paginator = PageNumberLimitPagination()
+        page = paginator.paginate_queryset(
+            recipe_ingredient_index.search(
+                query.validated_data['ingredients']
+            ),
+            request,
+            view=self
+        )
+        counts = {
+            recipe_id: (matched, missing)
+            for recipe_id, matched, missing in page
+        }
+        recipes = self.get_queryset().in_bulk(counts)
+        return paginator.get_paginated_response([
+            {
+                **recipe,
+                'matched_ingredients': counts[recipe['id']][0],
+                'missing_ingredients': counts[recipe['id']][1],
             }
-            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+            for recipe in render_recipes(
+                [recipes[recipe_id] for recipe_id in counts
+                 if recipe_id in recipes],
+                request
+            )
+        ])
 
-        finally:
-            csv_buffer.close()
+    def get_cart_etag(self, cart, cart_format):
+        checksum = hashlib.md5(cart_format.encode())
+        for row in cart.values_list(
+            'recipe_id', 'ingredient_id', 'amount',
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).order_by('recipe_id', 'ingredient_id').iterator():
+            checksum.update(repr(row).encode())
 
-        return response
+        return checksum.hexdigest()
 
     def preference_creator(self, serializer_class, pk, request):
         data = {
@@ -137,17 +272,20 @@ class RecipeViewSet(ModelViewSet):
         return self.preference_remover(Favorite, pk, request)
 
 
-class IngredientFilter(django_filters.FilterSet):
-    name = filters.CharFilter(field_name='name', lookup_expr='istartswith')
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
-
-
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(SnapshotListMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     permission_classes = (AllowAny,)
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
+    snapshot = Snapshot(
+        INGREDIENTS_VERSION,
+        lambda: JSONRenderer().render(
+            IngredientSerializer(Ingredient.objects.all(), many=True).data
+        )
+    )
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+
+        return super().list(request, *args, **kwargs)
@@ -3,6 +3,8 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
 
+from users.paginations import EstimatedCountPaginator
+
 
 class UserAdmin(UserAdmin):
     list_display = (
@@ -11,10 +13,14 @@ class UserAdmin(UserAdmin):
         'first_name',
         'last_name',
         'email',
+        'recipes_count',
+        'subscribers_count',
         'is_superuser',
         'is_active'
     )
-    list_filter = ('email', 'username',)
+    list_filter = ('is_staff', 'is_superuser', 'is_active',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(get_user_model(), UserAdmin)
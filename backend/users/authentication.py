@@ -0,0 +1,66 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router, transaction
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+TOKEN_KEY = 'auth:token:{}'
+CACHED_USER_FIELDS = {
+    'id',
+    'email',
+    'username',
+    'first_name',
+    'last_name',
+    'is_active',
+    'is_staff',
+    'is_superuser',
+}
+# Model.from_db ожидает значения в порядке полей модели.
+USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in CACHED_USER_FIELDS
+)
+
+
+def get_token_cache_key(key):
+    # В ключ кэша попадает хэш, а не сам токен.
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def forget_token(key):
+    cache_key = get_token_cache_key(key)
+    cache.delete(cache_key)
+    # Запрос до коммита мог снова закэшировать старую строку пользователя.
+    transaction.on_commit(lambda: cache.delete(cache_key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cache_key = get_token_cache_key(key)
+        values = cache.get(cache_key)
+        if values is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(
+                cache_key,
+                tuple(getattr(user, field) for field in USER_FIELDS),
+                settings.AUTH_TOKEN_CACHE_TIMEOUT
+            )
+            return user, token
+
+        user = User.from_db(router.db_for_read(User), USER_FIELDS, values)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                'User inactive or deleted.'
+            )
+
+        token = Token.from_db(
+            router.db_for_read(Token), ('key', 'user_id'), (key, user.id)
+        )
+        token.user = user
+        return user, token
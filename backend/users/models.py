@@ -4,10 +4,13 @@ from django.db import models
 from django.db.models import F, Q, UniqueConstraint
 from rest_framework.exceptions import ValidationError
 
+from recipes.counters import CounterFieldsMixin
+
 MAX_VALUE = 150
 
 
-class User(AbstractUser):
+class User(CounterFieldsMixin, AbstractUser):
+    counter_fields = ('recipes_count', 'subscribers_count')
     username_validator = UnicodeUsernameValidator()
 
     username = models.CharField(
@@ -36,6 +39,12 @@ class User(AbstractUser):
     email = models.EmailField(
         'email address', unique=True
     )
+    recipes_count = models.PositiveIntegerField(
+        'Число рецептов', default=0, editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0, editable=False
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name', 'password']
 
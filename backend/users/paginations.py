@@ -1,7 +1,80 @@
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class PageNumberLimitPagination(PageNumberPagination):
     page_size_query_param = 'limit'
-    page_size = settings.PAGE_SIZE
+    page_size = int(settings.PAGE_SIZE)
+    max_page_size = settings.MAX_PAGE_SIZE
+
+
+class CursorLimitPagination(CursorPagination):
+    page_size_query_param = 'limit'
+    page_size = int(settings.PAGE_SIZE)
+    max_page_size = settings.MAX_PAGE_SIZE
+    ordering = ('-created_at', '-id')
+
+
+class PageNumberOrCursorPagination(PageNumberLimitPagination):
+    cursor_pagination_class = CursorLimitPagination
+    cursor_paginator = None
+    search_query_param = 'search'
+    ordering_query_param = 'ordering'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_paginator = self.cursor_pagination_class()
+        if cursor_paginator.cursor_query_param in request.query_params:
+            self.check_cursor_order(cursor_paginator, request)
+            self.cursor_paginator = cursor_paginator
+            return cursor_paginator.paginate_queryset(queryset, request, view)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def check_cursor_order(self, cursor_paginator, request):
+        # Курсор держится на порядке по дате, релевантность и другие
+        # сортировки он молча отбросил бы.
+        ordering = tuple(
+            field.strip() for field in request.query_params.get(
+                self.ordering_query_param, ''
+            ).split(',') if field.strip()
+        )
+        if (request.query_params.get(self.search_query_param)
+                or ordering != cursor_paginator.ordering[:len(ordering)]):
+            raise ValidationError({
+                cursor_paginator.cursor_query_param: (
+                    f'Курсор нельзя сочетать с {self.search_query_param} '
+                    f'и {self.ordering_query_param}, используйте page.'
+                )
+            })
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+
+class EstimatedCountPaginator(Paginator):
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        # На больших таблицах без фильтров точный COUNT(*) заменяется оценкой.
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if not queryset.query.where and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                    (queryset.model._meta.db_table,)
+                )
+                estimate = int(cursor.fetchone()[0])
+
+            if estimate >= self.estimate_threshold:
+                return estimate
+
+        return super().count
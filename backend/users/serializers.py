@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
+from recipes.caching import subscription_ids
 from users.models import Subscription
 
 User = get_user_model()
@@ -22,13 +23,10 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, user):
-        return bool(
-            self.context.get('request')
-            and self.context.get('request').user.is_authenticated
-            and Subscription.objects.filter(
-                subscriber=self.context.get('request').user,
-                subscribed_to=user).exists()
-        )
+        if hasattr(user, 'is_subscribed'):
+            return user.is_subscribed
+
+        return user.id in subscription_ids.from_context(self.context)
 
 
 class SubscriptionRelatedSerializer(serializers.ModelSerializer):
@@ -61,7 +59,7 @@ class SubscriptionRelatedSerializer(serializers.ModelSerializer):
 
 class SubscriptionSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -82,8 +80,6 @@ class SubscriptionSerializer(UserSerializer):
         request = self.context.get('request')
         recipes_limit = request.GET.get('recipes_limit')
         recipes = (user.recipes.all()[:int(recipes_limit)]
-                   if recipes_limit else user.recipes.all())
+                   if recipes_limit and recipes_limit.isdigit()
+                   else user.recipes.all())
         return ShortRecipeSerializer(recipes, many=True).data
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
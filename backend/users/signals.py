@@ -0,0 +1,41 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes import counters
+from recipes.caching import subscription_ids
+from users.authentication import forget_token
+from users.models import Subscription, User
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(instance, created, **kwargs):
+    if created:
+        counters.change(
+            User, instance.subscribed_to_id, 'subscribers_count', 1
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(instance, **kwargs):
+    counters.change(User, instance.subscribed_to_id, 'subscribers_count', -1)
+
+
+@receiver((post_save, post_delete), sender=Subscription)
+def subscription_ids_changed(instance, **kwargs):
+    subscription_ids.invalidate(instance.subscriber_id)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, update_fields=None, **kwargs):
+    # Смена пароля или деактивация должны сразу отозвать закэшированный вход.
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        for key in Token.objects.filter(user=instance).values_list(
+            'key', flat=True
+        ):
+            forget_token(key)
@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Prefetch, Value, prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet as UVS
 from rest_framework import status
@@ -6,6 +7,8 @@ from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from recipes.filters import TiebreakOrderingFilter
+from recipes.models import Recipe
 from users.models import Subscription
 from users.paginations import PageNumberLimitPagination
 from users.serializers import (SubscriptionRelatedSerializer,
@@ -19,6 +22,9 @@ class UserViewSet(UVS):
     permission_classes = (AllowAny,)
     queryset = User.objects.all()
     pagination_class = PageNumberLimitPagination
+    filter_backends = (TiebreakOrderingFilter,)
+    ordering_fields = ('recipes_count', 'subscribers_count',)
+    ordering_tiebreak = ('id',)
     lookup_field = 'pk'
     http_method_names = [
         'get', 'post', 'head', 'options', 'delete'
@@ -41,19 +47,24 @@ class UserViewSet(UVS):
         detail=False,
     )
     def subscriptions(self, request):
-        paginator = PageNumberLimitPagination()
-        subscriptions = Subscription.objects.filter(subscriber=request.user)
-        subscribed_to_users = [
-            subscription.subscribed_to for subscription in subscriptions
-        ]
-        result_page = paginator.paginate_queryset(
-            subscribed_to_users,
-            request
-        )
+        authors = User.objects.filter(
+            subscribers__subscriber=request.user
+        ).annotate(
+            is_subscribed=Value(True)
+        ).order_by('subscribers__id')
+        page = self.paginate_queryset(self.filter_queryset(authors))
+        recipes = Recipe.objects.all()
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes.first_per_author(
+                [author.id for author in page], int(recipes_limit)
+            )
+
+        prefetch_related_objects(page, Prefetch('recipes', queryset=recipes))
         serializer = SubscriptionSerializer(
-            result_page, many=True, context={'request': request}
+            page, many=True, context={'request': request}
         )
-        return paginator.get_paginated_response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     @action(
         methods=['post', 'delete'],